@@ -4,9 +4,15 @@ import json
 import logging
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 
 from metricflow_server.auth import verify_admin_key
-from metricflow_server.engine_manager import engine_manager
+from metricflow_server.canary import CanaryRejected
+from metricflow_server.engine_manager import (
+    DEFAULT_PROJECT,
+    engine_manager,
+    validate_project_name,
+)
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/admin")
@@ -14,6 +20,15 @@ router = APIRouter(prefix="/admin")
 
 @router.post("/refresh", dependencies=[Depends(verify_admin_key)])
 async def refresh_manifest(request: Request):
+    return await refresh_project_manifest(DEFAULT_PROJECT, request)
+
+
+@router.post("/refresh/{project}", dependencies=[Depends(verify_admin_key)])
+async def refresh_project_manifest(project: str, request: Request):
+    try:
+        validate_project_name(project)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     body = await request.body()
     content = body.decode()
     if not content.strip():
@@ -29,7 +44,15 @@ async def refresh_manifest(request: Request):
             detail=f"Invalid JSON: {e}",
         )
     try:
-        engine_manager.load_manifest(content)
+        # Parsing (and the canary, if enabled) runs in a worker thread so the
+        # event loop keeps serving queries meanwhile.
+        report = await run_in_threadpool(engine_manager.load_manifest, content, project)
+    except CanaryRejected as e:
+        logger.warning("Manifest rejected by canary (project=%s): %s", project, e)
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": f"Canary failed: {e}", "canary": e.report.to_dict()},
+        )
     except ValueError as e:
         # MetricFlow rejected the manifest content (e.g. missing required fields).
         logger.warning("Invalid manifest rejected: %s", e)
@@ -44,4 +67,43 @@ async def refresh_manifest(request: Request):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error while loading manifest",
         )
-    return {"status": "ok"}
+    response = {
+        "status": "ok",
+        "project": project,
+        "manifest_version": engine_manager.manifest_version(project),
+    }
+    if report is not None:
+        response["canary"] = report.to_dict()
+    return response
+
+
+@router.get("/projects", dependencies=[Depends(verify_admin_key)])
+def list_projects():
+    """List known projects: active manifest version, residency and draining engines."""
+    return {"projects": engine_manager.projects()}
+
+
+@router.get("/canary", dependencies=[Depends(verify_admin_key)])
+def default_canary_report():
+    return project_canary_report(DEFAULT_PROJECT)
+
+
+@router.get("/canary/{project}", dependencies=[Depends(verify_admin_key)])
+def project_canary_report(project: str):
+    """Return the result of the last canary run for a project."""
+    report = engine_manager.canary_report(project)
+    if report is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No canary has run for project '{project}'",
+        )
+    return report.to_dict()
+
+
+@router.get("/startup", dependencies=[Depends(verify_admin_key)])
+def startup_report():
+    """Report how long each startup phase took and the warehouse connection status."""
+    return {
+        "phases_ms": engine_manager.startup_timings,
+        "connection": engine_manager.connection_status,
+    }
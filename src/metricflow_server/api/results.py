@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import itertools
+import json
+import mmap
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Any, Iterator, Optional
+
+from .schemas import SchemaField, SchemaInfo, serialize_cell
+
+# Size of the slices read from a spilled column when streaming it back.
+_CHUNK_SIZE = 64 * 1024
+
+
+def infer_type(value: Any) -> str:
+    """Map a serialised (JSON-safe) cell value to its Arrow-style type name."""
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int64"
+    if isinstance(value, float):
+        return "float64"
+    return "string"
+
+
+class SpilledColumns:
+    """Column-oriented result buffered on disk, one temporary file per column.
+
+    Each file holds the comma-separated JSON encoding of the column's values,
+    so a column can be streamed back verbatim as the body of a JSON array.
+    Reads go through a memory map, keeping resident memory bounded by the OS
+    page cache rather than by the size of the result.
+    """
+
+    def __init__(self, columns: list[str], directory: Optional[Path] = None) -> None:
+        self._files: dict[str, IO[bytes]] = {}
+        try:
+            for col in columns:
+                self._files[col] = tempfile.TemporaryFile(prefix="mfserver_spill_", dir=directory)
+        except BaseException:
+            self.close()
+            raise
+        self._sizes = dict.fromkeys(columns, 0)
+
+    def append(self, col: str, encoded: bytes) -> None:
+        f = self._files[col]
+        if self._sizes[col]:
+            f.write(b",")
+            self._sizes[col] += 1
+        f.write(encoded)
+        self._sizes[col] += len(encoded)
+
+    def iter_column(self, col: str) -> Iterator[bytes]:
+        size = self._sizes[col]
+        if not size:
+            # mmap refuses zero-length files.
+            return
+        f = self._files[col]
+        f.flush()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for offset in range(0, size, _CHUNK_SIZE):
+                yield mm[offset:offset + _CHUNK_SIZE]
+
+    def close(self) -> None:
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+
+
+@dataclass
+class CollectedResult:
+    columns: list[str]
+    schema: SchemaInfo
+    row_count: int
+    truncated: bool
+    # Exactly one of data / spill is set.
+    data: Optional[dict[str, list[Any]]] = None
+    spill: Optional[SpilledColumns] = None
+
+
+def collect_result(
+    data_table,
+    max_rows: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    spill_threshold: Optional[int] = None,
+    spill_dir: Optional[Path] = None,
+) -> CollectedResult:
+    """Convert a MetricFlow data table to column-oriented, JSON-safe data.
+
+    Rows beyond ``max_rows``, or past the point where the encoded result
+    would exceed ``max_bytes``, are dropped and the result is flagged as
+    truncated. When more than ``spill_threshold`` rows remain, values are
+    written to a ``SpilledColumns`` buffer instead of in-memory lists.
+    """
+    columns = list(data_table.column_names)
+    rows = data_table.rows
+    truncated = max_rows is not None and len(rows) > max_rows
+    total = max_rows if truncated else len(rows)
+
+    spill = None
+    data: Optional[dict[str, list[Any]]] = None
+    if spill_threshold is not None and total > spill_threshold:
+        spill = SpilledColumns(columns, spill_dir)
+    else:
+        data = {col: [] for col in columns}
+    encode = spill is not None or max_bytes is not None
+
+    types: dict[str, str] = {}
+    size = 0
+    count = 0
+    try:
+        for row in itertools.islice(rows, total):
+            values = [serialize_cell(v) for v in row]
+            if encode:
+                encoded = [json.dumps(v).encode() for v in values]
+                if max_bytes is not None:
+                    # One separator byte per value on top of its encoding.
+                    row_size = sum(len(e) for e in encoded) + len(encoded)
+                    if size + row_size > max_bytes:
+                        truncated = True
+                        break
+                    size += row_size
+            for i, col in enumerate(columns):
+                value = values[i]
+                if col not in types and value is not None:
+                    types[col] = infer_type(value)
+                if spill is not None:
+                    spill.append(col, encoded[i])
+                else:
+                    data[col].append(value)
+            count += 1
+    except BaseException:
+        if spill is not None:
+            spill.close()
+        raise
+
+    schema = SchemaInfo(
+        fields=[SchemaField(name=col, type=types.get(col, "string")) for col in columns]
+    )
+    return CollectedResult(
+        columns=columns,
+        schema=schema,
+        row_count=count,
+        truncated=truncated,
+        data=data,
+        spill=spill,
+    )
+
+
+def iter_spilled_response(sql: str, result: CollectedResult) -> Iterator[bytes]:
+    """Yield a QueryResponse-shaped JSON document for a spilled result.
+
+    The spill buffer is closed once the document has been fully produced
+    (or the consumer stops iterating).
+    """
+    spill = result.spill
+    try:
+        head = json.dumps({
+            "sql": sql,
+            "schema_info": result.schema.model_dump(),
+            "row_count": result.row_count,
+            "truncated": result.truncated,
+        })
+        # Re-open the object to append the streamed "data" member.
+        yield head[:-1].encode() + b', "data": {'
+        for i, col in enumerate(result.columns):
+            yield (b", " if i else b"") + json.dumps(col).encode() + b": ["
+            yield from spill.iter_column(col)
+            yield b"]"
+        yield b"}}"
+    finally:
+        spill.close()
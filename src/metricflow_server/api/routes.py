@@ -1,28 +1,26 @@
 from __future__ import annotations
 
 import logging
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
 
-from dbt_semantic_interfaces.type_enums import DimensionType
 from fastapi import APIRouter, Depends, HTTPException, Response, status
-from metricflow.engine.metricflow_engine import MetricFlowQueryRequest
-from metricflow_semantics.errors.error_classes import (
-    CustomerFacingSemanticException,
-    ExecutionException,
-    MetricNotFoundError,
-)
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask, BackgroundTasks
 
+from metricflow_server import capture
 from metricflow_server.auth import verify_api_key
-from metricflow_server.engine_manager import engine_manager
+from metricflow_server.config import settings
+from metricflow_server.engine_manager import DEFAULT_PROJECT, EngineSnapshot, engine_manager
 
+from .results import collect_result, iter_spilled_response
 from .schemas import (
     DimensionResponse,
     HealthResponse,
     MetricResponse,
     QueryRequest,
     QueryResponse,
-    SchemaField,
-    SchemaInfo,
-    serialize_cell,
 )
 
 logger = logging.getLogger(__name__)
@@ -30,18 +28,42 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/v1")
 
 
-def _require_engine():
-    engine = engine_manager.engine
-    if engine is None:
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="No manifest loaded – POST /admin/refresh first",
-        )
-    return engine
+# Response header carrying the version of the manifest that served the request.
+MANIFEST_VERSION_HEADER = "X-Manifest-Version"
+
+
+@contextmanager
+def _lease_snapshot(project: str = DEFAULT_PROJECT) -> Iterator[EngineSnapshot]:
+    with engine_manager.lease(project) as snapshot:
+        if snapshot is None:
+            refresh_path = (
+                "/admin/refresh" if project == DEFAULT_PROJECT else f"/admin/refresh/{project}"
+            )
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"No manifest loaded – POST {refresh_path} first",
+            )
+        yield snapshot
+
+
+def _row_cap(requested_limit: Optional[int]) -> Optional[int]:
+    """Return the server-imposed row cap for a query, or None if it doesn't need one."""
+    caps = [settings.max_result_rows]
+    if requested_limit is None:
+        caps.append(settings.default_query_limit)
+    caps = [c for c in caps if c is not None]
+    if not caps:
+        return None
+    cap = min(caps)
+    if requested_limit is not None and requested_limit <= cap:
+        return None
+    return cap
 
 
 def _serialize_dimension(d) -> DimensionResponse:
     """Convert a MetricFlow Dimension to the SDK-compatible response."""
+    from dbt_semantic_interfaces.type_enums import DimensionType
+
     granularities = []
     if d.type == DimensionType.TIME and d.type_params and d.type_params.time_granularity:
         granularities = [str(d.type_params.time_granularity)]
@@ -59,28 +81,95 @@ def _serialize_dimension(d) -> DimensionResponse:
 # ------------------------------------------------------------------
 # Health
 # ------------------------------------------------------------------
-@router.get("/health", response_model=HealthResponse)
+@router.get("/health", response_model=HealthResponse, response_model_exclude_none=True)
 def health(response: Response):
     if not engine_manager.is_ready:
         response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
         return HealthResponse(status="not_ready")
-    return HealthResponse(status="ready")
+    return HealthResponse(
+        status="ready", manifest_version=engine_manager.manifest_version(DEFAULT_PROJECT)
+    )
+
+
+@router.get(
+    "/{project}/health", response_model=HealthResponse, response_model_exclude_none=True
+)
+def project_health(project: str, response: Response):
+    if not engine_manager.is_loaded(project):
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return HealthResponse(status="not_ready")
+    return HealthResponse(
+        status="ready", manifest_version=engine_manager.manifest_version(project)
+    )
 
 
 # ------------------------------------------------------------------
 # Query
 # ------------------------------------------------------------------
 @router.post("/query", response_model=QueryResponse, dependencies=[Depends(verify_api_key)])
-def query(body: QueryRequest):
-    engine = _require_engine()
+def query(body: QueryRequest, response: Response):
+    return query_project(DEFAULT_PROJECT, body, response)
 
-    mf_request = MetricFlowQueryRequest.create_with_random_request_id(
+
+@router.post(
+    "/{project}/query", response_model=QueryResponse, dependencies=[Depends(verify_api_key)]
+)
+def query_project(project: str, body: QueryRequest, response: Response):
+    start = time.perf_counter()
+    status_code, rows, version = status.HTTP_500_INTERNAL_SERVER_ERROR, None, None
+    streamed = False
+
+    def record() -> None:
+        capture.record_query(
+            project=project,
+            manifest_version=version,
+            request=body,
+            latency_ms=(time.perf_counter() - start) * 1000,
+            rows=rows,
+            status_code=status_code,
+        )
+
+    try:
+        with _lease_snapshot(project) as snapshot:
+            version = snapshot.manifest_version
+            result, rows = _run_query(snapshot.engine, project, body)
+        status_code = status.HTTP_200_OK
+        # Streamed results are returned as-is, so the header goes on them directly.
+        target = result if isinstance(result, Response) else response
+        target.headers[MANIFEST_VERSION_HEADER] = version
+        if isinstance(result, StreamingResponse):
+            # Record once the body has been sent, so the latency includes streaming it.
+            result.background = BackgroundTasks([result.background, BackgroundTask(record)])
+            streamed = True
+        return result
+    except HTTPException as e:
+        status_code = e.status_code
+        raise
+    finally:
+        if not streamed:
+            record()
+
+
+def _run_query(engine, project: str, body: QueryRequest):
+    """Run a query and return the response along with its row count."""
+    # Imported here so the server starts without paying for MetricFlow's import.
+    from metricflow.engine.metricflow_engine import MetricFlowQueryRequest
+    from metricflow_semantics.errors.error_classes import (
+        CustomerFacingSemanticException,
+        ExecutionException,
+        MetricNotFoundError,
+    )
+
+    row_cap = _row_cap(body.limit)
+    shape = dict(
         metric_names=body.metrics,
         group_by_names=body.group_by,
         where_constraints=body.where,
         order_by_names=body.order_by,
-        limit=body.limit,
+        # Fetch one row past the cap so truncation can be detected.
+        limit=row_cap + 1 if row_cap is not None else body.limit,
     )
+    mf_request = MetricFlowQueryRequest.create_with_random_request_id(**shape)
     try:
         result = engine.query(mf_request)
     except Exception as e:
@@ -101,48 +190,63 @@ def query(body: QueryRequest):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Internal error ({cause_type}): {cause_msg}",
         )
+    engine_manager.record_query(project, shape)
 
-    data_table = result.result_df
-
-    columns = list(data_table.column_names)
-    # Build column-oriented data (like pa.Table.to_pydict())
-    col_data: dict[str, list] = {col: [] for col in columns}
-    for row in data_table.rows:
-        for i, col in enumerate(columns):
-            col_data[col].append(serialize_cell(row[i]))
-
-    # Infer types from first non-null value per column
-    def _infer_type(values: list) -> str:
-        for v in values:
-            if v is None:
-                continue
-            if isinstance(v, bool):
-                return "bool"
-            if isinstance(v, int):
-                return "int64"
-            if isinstance(v, float):
-                return "float64"
-            return "string"
-        return "string"
-
-    schema = SchemaInfo(
-        fields=[SchemaField(name=col, type=_infer_type(col_data[col])) for col in columns]
+    collected = collect_result(
+        result.result_df,
+        max_rows=row_cap,
+        max_bytes=settings.max_result_bytes,
+        spill_threshold=settings.spill_threshold_rows,
+        spill_dir=settings.spill_dir,
     )
+    if collected.truncated:
+        logger.warning(
+            "Query result truncated to %d rows (row cap=%s, byte cap=%s)",
+            collected.row_count, row_cap, settings.max_result_bytes,
+        )
+
+    if collected.spill is not None:
+        response = StreamingResponse(
+            iter_spilled_response(result.sql, collected),
+            media_type="application/json",
+            background=BackgroundTask(collected.spill.close),
+        )
+        return response, collected.row_count
 
-    return QueryResponse(
+    response = QueryResponse(
         sql=result.sql,
-        schema_info=schema,
-        data=col_data,
+        schema_info=collected.schema,
+        data=collected.data,
+        row_count=collected.row_count,
+        truncated=collected.truncated,
     )
+    return response, collected.row_count
 
 
 # ------------------------------------------------------------------
 # Metrics
 # ------------------------------------------------------------------
 @router.get("/metrics", response_model=list[MetricResponse], dependencies=[Depends(verify_api_key)])
-def list_metrics():
-    engine = _require_engine()
+def list_metrics(response: Response):
+    return list_project_metrics(DEFAULT_PROJECT, response)
+
+
+@router.get(
+    "/{project}/metrics",
+    response_model=list[MetricResponse],
+    dependencies=[Depends(verify_api_key)],
+)
+def list_project_metrics(project: str, response: Response):
+    with _lease_snapshot(project) as snapshot:
+        # The catalog only depends on the manifest, so build it once per snapshot.
+        catalog = snapshot.cache.get("metrics")
+        if catalog is None:
+            catalog = snapshot.cache["metrics"] = _build_metrics_catalog(snapshot.engine)
+        response.headers[MANIFEST_VERSION_HEADER] = snapshot.manifest_version
+        return catalog
+
 
+def _build_metrics_catalog(engine) -> list[MetricResponse]:
     results = []
     for m in engine.list_metrics():
         dims = [_serialize_dimension(d) for d in m.dimensions]
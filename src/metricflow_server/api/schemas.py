@@ -34,6 +34,9 @@ class QueryResponse(BaseModel):
     sql: str
     schema_info: SchemaInfo
     data: dict[str, list[Any]]
+    row_count: int = 0
+    # True when server-side row/byte caps dropped part of the result
+    truncated: bool = False
 
 
 class DimensionResponse(BaseModel):
@@ -57,6 +60,7 @@ class MetricResponse(BaseModel):
 
 class HealthResponse(BaseModel):
     status: str
+    manifest_version: Optional[str] = None
 
 
 # ------------------------------------------------------------------
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import logging
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Optional
+
+from metricflow_server.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Below this total planning time, timing differences are treated as noise.
+_MIN_COMPARABLE_MS = 50.0
+
+
+@dataclass
+class CanaryReport:
+    sampled: int = 0
+    current_failures: int = 0
+    candidate_failures: int = 0
+    # Request shapes that compile on the current engine but not on the candidate.
+    regressions: list[dict[str, Any]] = field(default_factory=list)
+    current_planning_ms: float = 0.0
+    candidate_planning_ms: float = 0.0
+    passed: bool = True
+    reason: Optional[str] = None
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+class CanaryRejected(Exception):
+    """Raised when a candidate engine fails the canary and is not swapped in."""
+
+    def __init__(self, report: CanaryReport) -> None:
+        super().__init__(report.reason)
+        self.report = report
+
+
+def _compile(engine, shape: dict[str, Any]) -> tuple[bool, float]:
+    """Plan (without executing) one request; return success and elapsed milliseconds."""
+    from metricflow.engine.metricflow_engine import MetricFlowQueryRequest
+
+    mf_request = MetricFlowQueryRequest.create_with_random_request_id(**shape)
+    start = time.perf_counter()
+    try:
+        engine.explain(mf_request)
+        ok = True
+    except Exception:
+        ok = False
+    return ok, (time.perf_counter() - start) * 1000
+
+
+def run_canary(current, candidate, shapes: list[dict[str, Any]]) -> CanaryReport:
+    """Compile recent request shapes on both engines and compare the results.
+
+    Each shape is compiled once on both engines to warm their caches before
+    the timed pass.
+
+    The candidate fails when more than ``canary_max_regressions`` shapes that
+    the current engine can plan fail on it, or when its total planning time
+    exceeds the current engine's by more than ``canary_max_slowdown`` times.
+    """
+    report = CanaryReport(sampled=len(shapes))
+    # The current engine's plan caches are warm from live traffic while the
+    # candidate's are cold. Compile everything once on both, untimed, so the
+    # timed pass below compares warm against warm.
+    for shape in shapes:
+        _compile(current, shape)
+        _compile(candidate, shape)
+    for shape in shapes:
+        current_ok, current_ms = _compile(current, shape)
+        candidate_ok, candidate_ms = _compile(candidate, shape)
+        report.current_failures += not current_ok
+        report.candidate_failures += not candidate_ok
+        if current_ok and not candidate_ok:
+            report.regressions.append(shape)
+        # Only shapes both engines can plan are comparable.
+        if current_ok and candidate_ok:
+            report.current_planning_ms += current_ms
+            report.candidate_planning_ms += candidate_ms
+    report.current_planning_ms = round(report.current_planning_ms, 1)
+    report.candidate_planning_ms = round(report.candidate_planning_ms, 1)
+
+    if len(report.regressions) > settings.canary_max_regressions:
+        report.passed = False
+        report.reason = (
+            f"{len(report.regressions)} of {report.sampled} recent queries no longer compile"
+        )
+    elif (
+        report.candidate_planning_ms > _MIN_COMPARABLE_MS
+        and report.candidate_planning_ms
+        > report.current_planning_ms * settings.canary_max_slowdown
+    ):
+        report.passed = False
+        report.reason = (
+            f"planning time grew from {report.current_planning_ms:.0f} ms "
+            f"to {report.candidate_planning_ms:.0f} ms"
+        )
+    logger.info(
+        "Canary %s: %d queries, %d regressions, planning %.0f ms -> %.0f ms",
+        "passed" if report.passed else "failed",
+        report.sampled,
+        len(report.regressions),
+        report.current_planning_ms,
+        report.candidate_planning_ms,
+    )
+    return report
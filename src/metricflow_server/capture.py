@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import json
+import logging
+import logging.handlers
+import queue
+import time
+from typing import Optional
+
+from pydantic import BaseModel
+
+from metricflow_server.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Dedicated logger for captured requests; never propagates to the app's handlers.
+_capture_logger = logging.getLogger("metricflow_server.capture.requests")
+_capture_logger.propagate = False
+_capture_logger.setLevel(logging.INFO)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional[logging.Handler] = None
+
+
+def start_capture() -> None:
+    """Start writing captured requests to MF_CAPTURE_DIR, if it is set.
+
+    Request threads only enqueue a record; a background listener thread does
+    the file I/O and rotates files once they reach MF_CAPTURE_MAX_BYTES.
+    """
+    global _listener, _handler
+    if settings.capture_dir is None or _listener is not None:
+        return
+    settings.capture_dir.mkdir(parents=True, exist_ok=True)
+    file_handler = logging.handlers.RotatingFileHandler(
+        settings.capture_dir / "requests.jsonl",
+        maxBytes=settings.capture_max_bytes,
+        backupCount=settings.capture_backup_count,
+        encoding="utf-8",
+    )
+    file_handler.setFormatter(logging.Formatter("%(message)s"))
+    _handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+    _listener = logging.handlers.QueueListener(_handler.queue, file_handler)
+    _listener.start()
+    _capture_logger.addHandler(_handler)
+    logger.info("Capturing query traffic to %s", settings.capture_dir)
+
+
+def stop_capture() -> None:
+    """Flush pending records and close the capture files."""
+    global _listener, _handler
+    if _listener is None:
+        return
+    _capture_logger.removeHandler(_handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+    _handler = None
+
+
+def record_query(
+    project: str,
+    manifest_version: Optional[str],
+    request: BaseModel,
+    latency_ms: float,
+    rows: Optional[int],
+    status_code: int,
+) -> None:
+    if _listener is None:
+        return
+    _capture_logger.info(json.dumps({
+        "ts": time.time(),
+        "project": project,
+        "manifest_version": manifest_version,
+        "request": request.model_dump(exclude_none=True),
+        "latency_ms": round(latency_ms, 1),
+        "rows": rows,
+        "status": status_code,
+    }))
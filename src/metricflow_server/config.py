@@ -3,8 +3,9 @@ from __future__ import annotations
 import base64
 import tempfile
 from pathlib import Path
-from typing import Optional
+from typing import Literal, Optional
 
+from pydantic import Field
 from pydantic_settings import BaseSettings
 
 
@@ -20,6 +21,39 @@ class Settings(BaseSettings):
     host: str = "0.0.0.0"
     port: int = 8080
     log_level: str = "info"
+    # Register the adapter directly from the profile instead of running `dbt debug`
+    fast_startup: bool = True
+    # Warehouse connection check: at "startup" (blocking), "deferred" (background) or "off"
+    validate_connection: Literal["startup", "deferred", "off"] = "deferred"
+    # Row limit applied to queries that don't set one (None = unlimited)
+    default_query_limit: Optional[int] = None
+    # Hard caps on a single query result; larger results are truncated
+    max_result_rows: Optional[int] = None
+    max_result_bytes: Optional[int] = None
+    # Results with more rows than this are buffered on disk instead of in memory
+    spill_threshold_rows: int = 50_000
+    # Directory for spilled results (defaults to the system temp dir)
+    spill_dir: Optional[Path] = None
+    # Directory for manifest snapshots used to rebuild evicted engines
+    # (defaults to a per-process temp dir)
+    snapshot_dir: Optional[Path] = None
+    # Engines kept in memory at once; least recently used ones are evicted
+    max_loaded_engines: int = 4
+    # Engines unused for longer than this are evicted (None = never)
+    engine_idle_seconds: Optional[int] = Field(default=None, gt=0)
+    # Compile recent queries against a new manifest before swapping it in
+    canary_enabled: bool = False
+    # Distinct recent queries kept per project and replayed by the canary
+    canary_sample_size: int = 50
+    # Recent queries allowed to stop compiling under the new manifest
+    canary_max_regressions: int = 0
+    # Allowed growth factor of total planning time under the new manifest
+    canary_max_slowdown: float = 2.0
+    # Directory for the captured query log (None = capture disabled)
+    capture_dir: Optional[Path] = None
+    # Size at which a capture file is rotated, and how many rotated files to keep
+    capture_max_bytes: int = 50 * 1024 * 1024
+    capture_backup_count: int = 10
 
     model_config = {
         "env_prefix": "MF_",
@@ -1,34 +1,159 @@
 from __future__ import annotations
 
+import hashlib
+import itertools
+import json
 import logging
+import os
+import re
 import shutil
 import tempfile
 import threading
+import time
+from argparse import Namespace
+from collections import OrderedDict
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Any, Callable, Iterator, NamedTuple, Optional
 
-from dbt.adapters.factory import get_adapter_by_type
-from dbt.cli.main import dbtRunner
-from dbt.config.runtime import load_profile, load_project
-from dbt_metricflow.cli.dbt_connectors.adapter_backed_client import AdapterBackedSqlClient
-from metricflow.engine.metricflow_engine import MetricFlowEngine
-from metricflow_semantics.model.dbt_manifest_parser import parse_manifest_from_dbt_generated_manifest
-from metricflow_semantics.model.semantic_manifest_lookup import SemanticManifestLookup
-
+from metricflow_server.canary import CanaryRejected, CanaryReport, run_canary
 from metricflow_server.config import settings
 
+# dbt and MetricFlow are imported inside the methods that need them: importing
+# them takes seconds, and the MetricFlow engine isn't needed until the first
+# manifest arrives.
+
 logger = logging.getLogger(__name__)
 
+DEFAULT_PROJECT = "default"
+_PROJECT_NAME_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+# Canary runs per refresh before giving up on a manifest that keeps being replaced.
+_CANARY_ATTEMPTS = 3
+
+
+def validate_project_name(project: str) -> None:
+    if not _PROJECT_NAME_RE.match(project):
+        raise ValueError(
+            f"Invalid project name {project!r} – use 1-64 letters, digits, '_' or '-'"
+        )
+
+
+class EngineSnapshot:
+    """An engine and the state derived from its manifest, published as one unit.
+
+    A snapshot is never modified once published, apart from entries memoised
+    in ``cache``; a reload publishes a new one. Readers hold a lease while they
+    use it, and a replaced snapshot is released – caches cleared, engine
+    dropped – only when its last lease ends.
+    """
+
+    def __init__(self, project: str, engine, manifest_version: str, generation: int) -> None:
+        self.project = project
+        self.engine = engine
+        self.manifest_version = manifest_version
+        self.generation = generation
+        # Per-snapshot memo for values derived from the engine (e.g. the metrics catalog).
+        self.cache: dict[str, Any] = {}
+        self.last_used = time.monotonic()
+        self._refs = 0
+        self._retired = False
+        self._released = False
+        self._on_released: Optional[Callable[[EngineSnapshot], None]] = None
+        # Guards only the reference count, never held while the engine is used.
+        self._refs_lock = threading.Lock()
+
+    @property
+    def in_flight(self) -> int:
+        return self._refs
+
+    @property
+    def released(self) -> bool:
+        return self._released
+
+    def acquire(self) -> bool:
+        """Take a lease; returns False if the snapshot has already been replaced."""
+        with self._refs_lock:
+            if self._retired:
+                return False
+            self._refs += 1
+        self.last_used = time.monotonic()
+        return True
+
+    def release(self) -> None:
+        with self._refs_lock:
+            self._refs -= 1
+            drained = self._retired and self._refs == 0
+        if drained:
+            self._free()
+
+    def retire(self, on_released: Optional[Callable[[EngineSnapshot], None]] = None) -> None:
+        """Mark as replaced; free once in-flight requests have drained.
+
+        ``on_released`` is called with the snapshot once it has been freed.
+        """
+        with self._refs_lock:
+            self._on_released = on_released
+            self._retired = True
+            drained = self._refs == 0
+        if drained:
+            self._free()
+
+    def _free(self) -> None:
+        self.cache.clear()
+        self.engine = None
+        self._released = True
+        logger.info(
+            "Released engine (project=%s, version=%s)", self.project, self.manifest_version
+        )
+        if self._on_released is not None:
+            self._on_released(self)
+
+
+class _ManifestFile(NamedTuple):
+    path: Path
+    version: str
+
 
 class EngineManager:
     def __init__(self) -> None:
-        self._engine = None
+        self._adapter = None
         self._sql_client = None
+        # Startup phase durations in milliseconds, in the order they ran.
+        self.startup_timings: dict[str, float] = {}
+        # "pending", "ok", "skipped" or "failed: <reason>".
+        self.connection_status = "pending"
+        # Active snapshot per project, and the on-disk manifest each one was built
+        # from (kept after eviction for rebuilds). Both dicts are replaced
+        # wholesale, never mutated, so readers can use them without a lock.
+        self._active: dict[str, EngineSnapshot] = {}
+        self._manifests: dict[str, _ManifestFile] = {}
+        # Replaced snapshots still serving in-flight requests; each removes itself
+        # when freed. Guarded by its own lock because snapshots are freed from
+        # request threads, sometimes while ``_lock`` is already held.
+        self._draining: set[EngineSnapshot] = set()
+        self._draining_lock = threading.Lock()
+        self._generations = itertools.count(1)
+        self._manifest_tmpdir: Optional[tempfile.TemporaryDirectory] = None
+        # Background thread that evicts idle engines (see start_idle_sweeper).
+        self._sweeper: Optional[threading.Thread] = None
+        self._sweeper_stop = threading.Event()
+        # Serialises writers (reloads, rebuilds, eviction); readers never take it.
         self._lock = threading.Lock()
+        # One lock per project so concurrent requests share a single rebuild.
+        self._rebuild_locks: dict[str, threading.Lock] = {}
+        # Recently served request shapes per project, oldest first, replayed by the canary.
+        self._recent_queries: dict[str, OrderedDict[str, dict[str, Any]]] = {}
+        self._canary_reports: dict[str, CanaryReport] = {}
+        self._canary_lock = threading.Lock()
 
     # ------------------------------------------------------------------
     # Adapter bootstrap
     # ------------------------------------------------------------------
     def init_adapter(self, profiles_dir: Path) -> None:
+        from dbt_metricflow.cli.dbt_connectors.adapter_backed_client import (
+            AdapterBackedSqlClient,
+        )
+
         tmpdir = tempfile.mkdtemp(prefix="mfserver_")
         try:
             dbt_project = (
@@ -38,66 +163,398 @@ class EngineManager:
             )
             (Path(tmpdir) / "dbt_project.yml").write_text(dbt_project)
 
-            logger.info("Running dbt debug to register adapter …")
-            logger.info("  project-dir: %s", tmpdir)
-            logger.info("  profiles-dir: %s", profiles_dir)
-            result = dbtRunner().invoke(
-                [
-                    "debug",
-                    "--quiet",
-                    "--project-dir",
-                    tmpdir,
-                    "--profiles-dir",
-                    str(profiles_dir),
-                ]
-            )
-            # dbt debug can fail on non-critical checks (e.g. git not installed).
-            # We only hard-fail if there's an exception or the connection test failed.
-            if result.exception:
-                raise RuntimeError(f"dbt debug raised an exception: {result.exception}")
-            if not result.success:
-                logger.warning("dbt debug reported failures (possibly non-critical), continuing…")
-
-            profile = load_profile(project_root=tmpdir, cli_vars={})
-            load_project(tmpdir, version_check=False, profile=profile)
-            adapter = get_adapter_by_type(profile.credentials.type)
+            with self.timed_phase("adapter"):
+                if settings.fast_startup:
+                    adapter = self._register_adapter(tmpdir, profiles_dir)
+                else:
+                    adapter = self._register_adapter_via_debug(tmpdir, profiles_dir)
+            self._adapter = adapter
             self._sql_client = AdapterBackedSqlClient(adapter)
-            logger.info("Adapter initialised (type=%s)", profile.credentials.type)
+            logger.info("Adapter initialised (type=%s)", adapter.type())
         finally:
             shutil.rmtree(tmpdir, ignore_errors=True)
 
+        mode = settings.validate_connection
+        if mode == "startup":
+            with self.timed_phase("connection"):
+                self.validate_connection()
+        elif mode == "deferred":
+            threading.Thread(
+                target=self._validate_connection_in_background,
+                name="mfserver-validate-connection",
+                daemon=True,
+            ).start()
+        else:
+            self.connection_status = "skipped"
+
+    def _register_adapter(self, project_dir: str, profiles_dir: Path):
+        """Register the adapter straight from the profile, without running dbt debug."""
+        from dbt.adapters.factory import get_adapter, register_adapter
+        from dbt.config.runtime import RuntimeConfig, load_profile, load_project
+        from dbt.flags import set_from_args
+        from dbt.mp_context import get_mp_context
+
+        logger.info("Registering adapter from profile (profiles-dir: %s) …", profiles_dir)
+        args = Namespace(profiles_dir=str(profiles_dir), project_dir=project_dir)
+        # load_profile reads the profiles dir from dbt's global flags.
+        set_from_args(args, None)
+        profile = load_profile(project_root=project_dir, cli_vars={})
+        project = load_project(project_dir, version_check=False, profile=profile)
+        config = RuntimeConfig.from_parts(project, profile, args)
+        register_adapter(config, get_mp_context())
+        return get_adapter(config)
+
+    def _register_adapter_via_debug(self, project_dir: str, profiles_dir: Path):
+        """Register the adapter as a side effect of a full dbt debug run."""
+        from dbt.adapters.factory import get_adapter_by_type
+        from dbt.cli.main import dbtRunner
+        from dbt.config.runtime import load_profile, load_project
+
+        logger.info("Running dbt debug to register adapter …")
+        logger.info("  project-dir: %s", project_dir)
+        logger.info("  profiles-dir: %s", profiles_dir)
+        result = dbtRunner().invoke(
+            [
+                "debug",
+                "--quiet",
+                "--project-dir",
+                project_dir,
+                "--profiles-dir",
+                str(profiles_dir),
+            ]
+        )
+        # dbt debug can fail on non-critical checks (e.g. git not installed).
+        # We only hard-fail if there's an exception or the connection test failed.
+        if result.exception:
+            raise RuntimeError(f"dbt debug raised an exception: {result.exception}")
+        if not result.success:
+            logger.warning("dbt debug reported failures (possibly non-critical), continuing…")
+
+        profile = load_profile(project_root=project_dir, cli_vars={})
+        load_project(project_dir, version_check=False, profile=profile)
+        return get_adapter_by_type(profile.credentials.type)
+
+    def validate_connection(self) -> None:
+        """Open a warehouse connection and run the adapter's debug query."""
+        if self._adapter is None:
+            raise RuntimeError("Adapter not initialised – call init_adapter first")
+        try:
+            with self._adapter.connection_named("mfserver_validate"):
+                self._adapter.debug_query()
+        except Exception as e:
+            self.connection_status = f"failed: {e}"
+            raise
+        self.connection_status = "ok"
+        logger.info("Warehouse connection validated")
+
+    def _validate_connection_in_background(self) -> None:
+        try:
+            with self.timed_phase("connection"):
+                self.validate_connection()
+        except Exception as e:
+            # Deferred validation only reports; queries surface real failures.
+            logger.warning("Warehouse connection check failed: %s", e)
+
+    @contextmanager
+    def timed_phase(self, name: str) -> Iterator[None]:
+        """Record and log how long a startup phase takes."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.startup_timings[name] = round(elapsed_ms, 1)
+            logger.info("Startup phase '%s' took %.0f ms", name, elapsed_ms)
+
     # ------------------------------------------------------------------
     # Manifest hot-reload
     # ------------------------------------------------------------------
-    def load_manifest(self, manifest_json: str) -> None:
+    def load_manifest(
+        self, manifest_json: str, project: str = DEFAULT_PROJECT
+    ) -> Optional[CanaryReport]:
+        """Build an engine from the manifest and publish it as the project's snapshot.
+
+        With MF_CANARY_ENABLED, recent queries are first compiled against the
+        new engine; CanaryRejected is raised (and nothing is swapped) if it
+        performs worse than the current one. Returns the canary report, if any.
+        """
+        validate_project_name(project)
+        engine = self._build_engine(manifest_json, project)
+
+        # Write the manifest next to its final path so the swap below is atomic.
+        path = self._manifest_dir() / f"{project}.json"
+        fd, tmp = tempfile.mkstemp(prefix=f"{project}.", suffix=".tmp", dir=path.parent)
+        with os.fdopen(fd, "w") as f:
+            f.write(manifest_json)
+        version = hashlib.sha256(manifest_json.encode()).hexdigest()[:12]
+        try:
+            for _ in range(_CANARY_ATTEMPTS):
+                report, baseline = (
+                    self._run_canary(project, engine) if settings.canary_enabled else (None, None)
+                )
+                if report is not None and not report.passed:
+                    raise CanaryRejected(report)
+                with self._lock:
+                    # The canary ran against `baseline`; if another refresh has
+                    # swapped the manifest since, validate again against it.
+                    if report is not None and self.manifest_version(project) != baseline:
+                        continue
+                    os.replace(tmp, path)
+                    self._manifests = {**self._manifests, project: _ManifestFile(path, version)}
+                    self._publish_locked(
+                        EngineSnapshot(project, engine, version, next(self._generations))
+                    )
+                    break
+            else:
+                report.passed = False
+                report.reason = "manifest kept changing while the canary ran"
+                raise CanaryRejected(report)
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+        logger.info(
+            "MetricFlowEngine reloaded successfully (project=%s, version=%s)", project, version
+        )
+        return report
+
+    def _build_engine(self, manifest_json: str, project: str):
         if self._sql_client is None:
             raise RuntimeError("Adapter not initialised – call init_adapter first")
 
-        logger.info("Parsing semantic manifest …")
+        from metricflow.engine.metricflow_engine import MetricFlowEngine
+        from metricflow_semantics.model.dbt_manifest_parser import (
+            parse_manifest_from_dbt_generated_manifest,
+        )
+        from metricflow_semantics.model.semantic_manifest_lookup import SemanticManifestLookup
+
+        logger.info("Parsing semantic manifest (project=%s) …", project)
         semantic_manifest = parse_manifest_from_dbt_generated_manifest(
             manifest_json_string=manifest_json
         )
         lookup = SemanticManifestLookup(semantic_manifest)
-        engine = MetricFlowEngine(
+        return MetricFlowEngine(
             semantic_manifest_lookup=lookup,
             sql_client=self._sql_client,
         )
+
+    def _manifest_dir(self) -> Path:
+        if settings.snapshot_dir is not None:
+            settings.snapshot_dir.mkdir(parents=True, exist_ok=True)
+            return settings.snapshot_dir
+        if self._manifest_tmpdir is None:
+            self._manifest_tmpdir = tempfile.TemporaryDirectory(prefix="mfserver_snapshots_")
+        return Path(self._manifest_tmpdir.name)
+
+    # ------------------------------------------------------------------
+    # Canary
+    # ------------------------------------------------------------------
+    def record_query(self, project: str, shape: dict[str, Any]) -> None:
+        """Remember a successfully served request (MetricFlowQueryRequest kwargs)."""
+        if not settings.canary_enabled:
+            return
+        key = json.dumps(shape, sort_keys=True)
+        with self._canary_lock:
+            recent = self._recent_queries.setdefault(project, OrderedDict())
+            recent[key] = shape
+            recent.move_to_end(key)
+            while len(recent) > settings.canary_sample_size:
+                recent.popitem(last=False)
+
+    def _run_canary(
+        self, project: str, candidate
+    ) -> tuple[Optional[CanaryReport], Optional[str]]:
+        """Run the canary; return its report and the manifest version it compared against."""
+        with self._canary_lock:
+            shapes = list(self._recent_queries.get(project, {}).values())
+        # Nothing to compare on first load or before any traffic.
+        if not shapes:
+            return None, None
+        with self.lease(project) as current:
+            if current is None:
+                return None, None
+            logger.info(
+                "Running canary with %d recent queries (project=%s) …", len(shapes), project
+            )
+            report = run_canary(current.engine, candidate, shapes)
+            baseline = current.manifest_version
+        with self._canary_lock:
+            self._canary_reports[project] = report
+        return report, baseline
+
+    def canary_report(self, project: str) -> Optional[CanaryReport]:
+        with self._canary_lock:
+            return self._canary_reports.get(project)
+
+    # ------------------------------------------------------------------
+    # Publication and eviction
+    # ------------------------------------------------------------------
+    def _publish_locked(self, snapshot: EngineSnapshot) -> None:
+        """Swap in a snapshot, evict as needed and retire what was replaced.
+
+        Caller must hold _lock.
+        """
+        active = dict(self._active)
+        replaced = [active.get(snapshot.project)]
+        active[snapshot.project] = snapshot
+        replaced += self._evict(active, keep=snapshot)
+        self._active = active
+        for old in replaced:
+            if old is not None:
+                self._retire_locked(old)
+
+    def _retire_locked(self, snapshot: EngineSnapshot) -> None:
+        with self._draining_lock:
+            self._draining.add(snapshot)
+        snapshot.retire(on_released=self._forget_draining)
+
+    def _forget_draining(self, snapshot: EngineSnapshot) -> None:
+        with self._draining_lock:
+            self._draining.discard(snapshot)
+
+    def _evict(
+        self, active: dict[str, EngineSnapshot], keep: EngineSnapshot
+    ) -> list[EngineSnapshot]:
+        """Remove idle and least recently used snapshots from ``active``.
+
+        ``keep`` – the snapshot being published – is never evicted.
+        """
+        evicted = self._evict_idle(active, keep)
+        while len(active) > max(settings.max_loaded_engines, 1):
+            snapshot = min(
+                (s for s in active.values() if s is not keep), key=lambda s: s.last_used
+            )
+            evicted.append(active.pop(snapshot.project))
+            logger.info("Evicted least recently used engine (project=%s)", snapshot.project)
+        return evicted
+
+    def _evict_idle(
+        self, active: dict[str, EngineSnapshot], keep: Optional[EngineSnapshot] = None
+    ) -> list[EngineSnapshot]:
+        """Remove snapshots unused for longer than MF_ENGINE_IDLE_SECONDS from ``active``."""
+        if settings.engine_idle_seconds is None:
+            return []
+        cutoff = time.monotonic() - settings.engine_idle_seconds
+        evicted = []
+        idle = [s for s in active.values() if s is not keep and s.last_used < cutoff]
+        for snapshot in idle:
+            evicted.append(active.pop(snapshot.project))
+            logger.info("Evicted idle engine (project=%s)", snapshot.project)
+        return evicted
+
+    def evict_idle(self) -> None:
+        """Retire every engine that has been idle for longer than MF_ENGINE_IDLE_SECONDS."""
+        with self._lock:
+            active = dict(self._active)
+            evicted = self._evict_idle(active)
+            if evicted:
+                self._active = active
+                for snapshot in evicted:
+                    self._retire_locked(snapshot)
+
+    def start_idle_sweeper(self) -> None:
+        """Evict idle engines periodically, even when no reload or rebuild happens."""
+        if settings.engine_idle_seconds is None or self._sweeper is not None:
+            return
+        # Check twice per idle period, but at least once a minute.
+        interval = min(max(settings.engine_idle_seconds / 2, 0.05), 60)
+        self._sweeper_stop.clear()
+
+        def sweep() -> None:
+            while not self._sweeper_stop.wait(interval):
+                try:
+                    self.evict_idle()
+                except Exception:
+                    logger.exception("Idle engine sweep failed")
+
+        self._sweeper = threading.Thread(target=sweep, name="mfserver-idle-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop_idle_sweeper(self) -> None:
+        if self._sweeper is None:
+            return
+        self._sweeper_stop.set()
+        self._sweeper.join()
+        self._sweeper = None
+
+    def _rebuild(self, project: str) -> None:
+        """Rebuild an evicted project's engine from its manifest file and publish it."""
         with self._lock:
-            self._engine = engine
-        logger.info("MetricFlowEngine reloaded successfully")
+            rebuild_lock = self._rebuild_locks.setdefault(project, threading.Lock())
+        with rebuild_lock:
+            # Requests that waited here find the engine the first one built.
+            manifest = self._manifests.get(project)
+            if manifest is None or project in self._active:
+                return
+            logger.info("Rebuilding evicted engine from snapshot (project=%s)", project)
+            engine = self._build_engine(manifest.path.read_text(), project)
+            with self._lock:
+                # A refresh may have replaced it meanwhile.
+                if project in self._active or self._manifests.get(project) != manifest:
+                    return
+                self._publish_locked(
+                    EngineSnapshot(project, engine, manifest.version, next(self._generations))
+                )
 
     # ------------------------------------------------------------------
     # Access
     # ------------------------------------------------------------------
-    @property
-    def engine(self):
-        with self._lock:
-            return self._engine
+    @contextmanager
+    def lease(self, project: str = DEFAULT_PROJECT) -> Iterator[Optional[EngineSnapshot]]:
+        """Hold the project's active snapshot for the duration of the block.
+
+        Yields None if the project has no manifest. The snapshot stays usable
+        until the block exits, even if a reload replaces it meanwhile.
+        """
+        snapshot = self._acquire(project)
+        try:
+            yield snapshot
+        finally:
+            if snapshot is not None:
+                snapshot.release()
+
+    def _acquire(self, project: str) -> Optional[EngineSnapshot]:
+        while True:
+            snapshot = self._active.get(project)
+            if snapshot is None:
+                if project not in self._manifests:
+                    return None
+                self._rebuild(project)
+            elif snapshot.acquire():
+                return snapshot
+            # Otherwise it was replaced between the read and the acquire: retry.
+
+    def manifest_version(self, project: str = DEFAULT_PROJECT) -> Optional[str]:
+        manifest = self._manifests.get(project)
+        return manifest.version if manifest is not None else None
+
+    def is_loaded(self, project: str) -> bool:
+        return project in self._manifests
 
     @property
     def is_ready(self) -> bool:
-        with self._lock:
-            return self._engine is not None
+        """True once at least one project has a manifest."""
+        return bool(self._manifests)
+
+    def projects(self) -> list[dict[str, Any]]:
+        """Describe every known project: active version, residency and draining engines."""
+        with self._draining_lock:
+            draining = list(self._draining)
+        active = self._active
+        result = []
+        for name, manifest in sorted(self._manifests.items()):
+            snapshot = active.get(name)
+            result.append({
+                "name": name,
+                "manifest_version": manifest.version,
+                "resident": snapshot is not None,
+                "in_flight": snapshot.in_flight if snapshot is not None else 0,
+                "draining": [
+                    {"manifest_version": s.manifest_version, "in_flight": s.in_flight}
+                    for s in draining
+                    if s.project == name
+                ],
+            })
+        return result
 
 
 engine_manager = EngineManager()
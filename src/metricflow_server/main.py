@@ -6,6 +6,7 @@ from contextlib import asynccontextmanager
 import uvicorn
 from fastapi import FastAPI
 
+from metricflow_server import capture
 from metricflow_server.api.admin import router as admin_router
 from metricflow_server.api.routes import router as api_router
 from metricflow_server.config import settings
@@ -17,14 +18,22 @@ logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    profiles_dir = settings.resolve_profiles_dir()
+    with engine_manager.timed_phase("profiles"):
+        profiles_dir = settings.resolve_profiles_dir()
     source = "MF_PROFILES_B64" if settings.profiles_b64 else "MF_DBT_PROFILES_DIR"
     logger.info("Initialising dbt adapter (profiles_dir=%s, source=%s) …", profiles_dir, source)
     try:
         engine_manager.init_adapter(profiles_dir)
-        logger.info("Adapter ready – waiting for manifest via POST /admin/refresh")
+        logger.info(
+            "Adapter ready in %.0f ms – waiting for manifest via POST /admin/refresh",
+            sum(engine_manager.startup_timings.values()),
+        )
+        capture.start_capture()
+        engine_manager.start_idle_sweeper()
         yield
     finally:
+        engine_manager.stop_idle_sweeper()
+        capture.stop_capture()
         settings.cleanup_profiles_dir()
 
 
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+# Status reported for requests that never got an HTTP response.
+CONNECTION_ERROR = 0
+# Status reported when sending a record raised (e.g. a malformed capture line).
+CLIENT_ERROR = -1
+
+_STATUS_LABELS = {CONNECTION_ERROR: "conn_error", CLIENT_ERROR: "client_error"}
+
+
+def _percentile(values: list[float], p: float) -> float:
+    """Nearest-rank percentile (0 when empty)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(p / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+@dataclass
+class ReplayStats:
+    # Measured from each request's scheduled send time, so queueing behind
+    # saturated workers counts towards latency.
+    latencies_ms: list[float] = field(default_factory=list)
+    # How late each request actually started relative to its schedule.
+    lag_ms: list[float] = field(default_factory=list)
+    statuses: dict[int, int] = field(default_factory=dict)
+    elapsed_s: float = 0.0
+
+    @property
+    def total(self) -> int:
+        return sum(self.statuses.values())
+
+    @property
+    def errors(self) -> int:
+        return sum(n for code, n in self.statuses.items() if not 200 <= code < 300)
+
+    def percentile(self, p: float) -> float:
+        """Nearest-rank percentile of the recorded latencies (0 when empty)."""
+        return _percentile(self.latencies_ms, p)
+
+    def summary(self) -> str:
+        total = self.total
+        lines = [
+            f"requests:    {total} in {self.elapsed_s:.1f}s "
+            f"({total / self.elapsed_s if self.elapsed_s else 0:.1f} req/s)",
+            f"errors:      {self.errors} ({self.errors / total if total else 0:.1%})",
+            "latency ms:  "
+            + "  ".join(f"p{p}={self.percentile(p):.0f}" for p in (50, 90, 95, 99))
+            + f"  max={max(self.latencies_ms, default=0):.0f}",
+            "send lag ms: "
+            + "  ".join(f"p{p}={_percentile(self.lag_ms, p):.0f}" for p in (50, 99))
+            + f"  max={max(self.lag_ms, default=0):.0f}",
+            "status:      "
+            + "  ".join(
+                f"{_STATUS_LABELS.get(code, code)}={n}"
+                for code, n in sorted(self.statuses.items())
+            ),
+        ]
+        return "\n".join(lines)
+
+
+def load_records(paths: Iterable[Path]) -> list[dict]:
+    """Read capture files (including rotated ones) and order records by time.
+
+    Lines that are not a JSON object with a numeric ``ts`` – e.g. one truncated
+    by a killed process or a file copied mid-write – are skipped with a warning.
+    """
+    records = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for lineno, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    valid = isinstance(record, dict) and isinstance(record.get("ts"), (int, float))
+                except json.JSONDecodeError:
+                    valid = False
+                if not valid:
+                    print(f"Skipping malformed record at {path}:{lineno}", file=sys.stderr)
+                    continue
+                records.append(record)
+    records.sort(key=lambda r: r["ts"])
+    return records
+
+
+def http_sender(base_url: str, api_key: str, timeout: float) -> Callable[[dict], int]:
+    """Return a function that POSTs a captured record's request and returns the status."""
+    base_url = base_url.rstrip("/")
+
+    def send(record: dict) -> int:
+        project = record.get("project", "default")
+        path = "/api/v1/query" if project == "default" else f"/api/v1/{project}/query"
+        req = urllib.request.Request(
+            base_url + path,
+            data=json.dumps(record["request"]).encode(),
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json",
+            },
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=timeout) as resp:
+                resp.read()
+                return resp.status
+        except urllib.error.HTTPError as e:
+            return e.code
+        except (urllib.error.URLError, OSError):
+            return CONNECTION_ERROR
+
+    return send
+
+
+def replay(
+    records: list[dict],
+    send: Callable[[dict], int],
+    speedup: float = 1.0,
+    concurrency: int = 8,
+) -> ReplayStats:
+    """Send records with their original spacing divided by ``speedup``.
+
+    Latency is measured from each record's scheduled send time, so time spent
+    waiting for a free worker when ``concurrency`` is saturated is included.
+    A ``speedup`` of 0 sends records back to back, limited only by
+    ``concurrency``; with no schedule, latency is then measured from when a
+    worker picks the record up.
+    """
+    stats = ReplayStats()
+    lock = threading.Lock()
+
+    def run(record: dict, scheduled: Optional[float]) -> None:
+        picked_up = time.perf_counter()
+        if scheduled is None:
+            scheduled = picked_up
+        try:
+            code = send(record)
+        except Exception:
+            code = CLIENT_ERROR
+        latency_ms = (time.perf_counter() - scheduled) * 1000
+        with lock:
+            stats.latencies_ms.append(latency_ms)
+            stats.lag_ms.append((picked_up - scheduled) * 1000)
+            stats.statuses[code] = stats.statuses.get(code, 0) + 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        first_ts = records[0]["ts"] if records else 0.0
+        for record in records:
+            scheduled = None
+            if speedup > 0:
+                scheduled = start + (record["ts"] - first_ts) / speedup
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            pool.submit(run, record, scheduled)
+    stats.elapsed_s = time.perf_counter() - start
+    return stats
+
+
+def cli(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="metricflow-server-replay",
+        description="Replay captured /api/v1/query traffic against a metricflow-server.",
+    )
+    parser.add_argument("files", nargs="+", type=Path, help="Capture files (requests.jsonl*)")
+    parser.add_argument("--url", default="http://localhost:8080", help="Server base URL")
+    parser.add_argument(
+        "--api-key", default=os.environ.get("MF_API_KEY"), help="Defaults to MF_API_KEY"
+    )
+    parser.add_argument(
+        "--speedup", type=float, default=1.0,
+        help="Replay speed relative to the original traffic (0 = as fast as possible)",
+    )
+    parser.add_argument("--concurrency", type=int, default=8, help="Max in-flight requests")
+    parser.add_argument(
+        "--timeout", type=float, default=300.0, help="Per-request timeout in seconds"
+    )
+    args = parser.parse_args(argv)
+
+    if not args.api_key:
+        parser.error("an API key is required (--api-key or MF_API_KEY)")
+    if args.speedup < 0 or args.concurrency < 1:
+        parser.error("--speedup must be >= 0 and --concurrency >= 1")
+
+    records = load_records(args.files)
+    if not records:
+        print("No captured requests found", file=sys.stderr)
+        sys.exit(1)
+    print(f"Replaying {len(records)} requests against {args.url} …")
+    stats = replay(
+        records,
+        http_sender(args.url, args.api_key, args.timeout),
+        speedup=args.speedup,
+        concurrency=args.concurrency,
+    )
+    print(stats.summary())
+
+
+if __name__ == "__main__":
+    cli()
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import datetime
 from decimal import Decimal
+from pathlib import Path
 from unittest.mock import MagicMock, patch
 
 import pytest
@@ -11,10 +12,26 @@ from fastapi.testclient import TestClient
 with patch("metricflow_server.engine_manager.EngineManager.init_adapter"):
     from metricflow_server.main import app
 
+from metricflow_server.engine_manager import (
+    DEFAULT_PROJECT,
+    EngineSnapshot,
+    _ManifestFile,
+    engine_manager,
+)
+
 API_KEY = "test-api-key"
 ADMIN_KEY = "test-admin-key"
 
 
+def _loaded(engine, project=DEFAULT_PROJECT, version="abc123"):
+    """Make `engine` the active engine for `project` for the duration of the block."""
+    return patch.multiple(
+        engine_manager,
+        _active={project: EngineSnapshot(project, engine, version, 1)},
+        _manifests={project: _ManifestFile(Path("unused.json"), version)},
+    )
+
+
 @pytest.fixture
 def client():
     with patch("metricflow_server.engine_manager.EngineManager.init_adapter"):
@@ -66,10 +83,10 @@ def test_health_not_ready(client):
 
 
 def test_health_ready(client, mock_engine):
-    with patch("metricflow_server.engine_manager.engine_manager._engine", mock_engine):
+    with _loaded(mock_engine):
         response = client.get("/api/v1/health")
     assert response.status_code == 200
-    assert response.json() == {"status": "ready"}
+    assert response.json() == {"status": "ready", "manifest_version": "abc123"}
 
 
 # ------------------------------------------------------------------
@@ -118,7 +135,7 @@ def test_query_503_when_not_ready(client):
 # Metrics
 # ------------------------------------------------------------------
 def test_list_metrics(client, mock_engine):
-    with patch("metricflow_server.engine_manager.engine_manager._engine", mock_engine):
+    with _loaded(mock_engine):
         response = client.get(
             "/api/v1/metrics",
             headers={"Authorization": f"Bearer {API_KEY}"},
@@ -135,7 +152,7 @@ def test_list_metrics(client, mock_engine):
 # Query
 # ------------------------------------------------------------------
 def test_query(client, mock_engine):
-    with patch("metricflow_server.engine_manager.engine_manager._engine", mock_engine):
+    with _loaded(mock_engine):
         response = client.post(
             "/api/v1/query",
             headers={"Authorization": f"Bearer {API_KEY}"},
@@ -150,8 +167,81 @@ def test_query(client, mock_engine):
     assert data["data"]["revenue"] == [1234.56, 789.01]
 
 
+def test_query_default_limit_truncates(client, mock_engine):
+    from metricflow_server.config import settings
+
+    with _loaded(mock_engine), \
+            patch.object(settings, "default_query_limit", 1):
+        response = client.post(
+            "/api/v1/query",
+            headers={"Authorization": f"Bearer {API_KEY}"},
+            json={"metrics": ["revenue"], "group_by": ["location__location_name"]},
+        )
+    assert response.status_code == 200
+    # One extra row is requested so truncation can be detected.
+    assert mock_engine.query.call_args.args[0].limit == 2
+    data = response.json()
+    assert data["data"]["revenue"] == [1234.56]
+    assert data["row_count"] == 1
+    assert data["truncated"] is True
+
+
+def test_query_limit_below_cap_not_truncated(client, mock_engine):
+    from metricflow_server.config import settings
+
+    with _loaded(mock_engine), \
+            patch.object(settings, "max_result_rows", 10):
+        response = client.post(
+            "/api/v1/query",
+            headers={"Authorization": f"Bearer {API_KEY}"},
+            json={"metrics": ["revenue"], "limit": 5},
+        )
+    assert response.status_code == 200
+    assert mock_engine.query.call_args.args[0].limit == 5
+    assert response.json()["truncated"] is False
+
+
+def test_query_max_bytes_truncates(client, mock_engine):
+    from metricflow_server.config import settings
+
+    with _loaded(mock_engine), \
+            patch.object(settings, "max_result_bytes", 20):
+        response = client.post(
+            "/api/v1/query",
+            headers={"Authorization": f"Bearer {API_KEY}"},
+            json={"metrics": ["revenue"], "group_by": ["location__location_name"]},
+        )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["data"]["location__location_name"] == ["Paris"]
+    assert data["truncated"] is True
+
+
+def test_query_spilled_result_matches_in_memory(client, mock_engine):
+    from metricflow_server.config import settings
+
+    mock_engine.query.return_value.result_df.rows = [
+        ("Paris", 1234.56), ("Lyon", None), (None, 3.0),
+    ]
+    with _loaded(mock_engine):
+        in_memory = client.post(
+            "/api/v1/query",
+            headers={"Authorization": f"Bearer {API_KEY}"},
+            json={"metrics": ["revenue"], "group_by": ["location__location_name"]},
+        )
+        with patch.object(settings, "spill_threshold_rows", 1):
+            spilled = client.post(
+                "/api/v1/query",
+                headers={"Authorization": f"Bearer {API_KEY}"},
+                json={"metrics": ["revenue"], "group_by": ["location__location_name"]},
+            )
+    assert spilled.status_code == 200
+    assert spilled.json() == in_memory.json()
+    assert spilled.json()["data"]["revenue"] == [1234.56, None, 3.0]
+
+
 def test_query_missing_metrics(client, mock_engine):
-    with patch("metricflow_server.engine_manager.engine_manager._engine", mock_engine):
+    with _loaded(mock_engine):
         response = client.post(
             "/api/v1/query",
             headers={"Authorization": f"Bearer {API_KEY}"},
@@ -160,6 +250,222 @@ def test_query_missing_metrics(client, mock_engine):
     assert response.status_code == 422  # pydantic validation — metrics is required
 
 
+# ------------------------------------------------------------------
+# Named projects
+# ------------------------------------------------------------------
+def test_query_named_project(client, mock_engine):
+    with _loaded(mock_engine, "sales"):
+        response = client.post(
+            "/api/v1/sales/query",
+            headers={"Authorization": f"Bearer {API_KEY}"},
+            json={"metrics": ["revenue"]},
+        )
+        default_response = client.post(
+            "/api/v1/query",
+            headers={"Authorization": f"Bearer {API_KEY}"},
+            json={"metrics": ["revenue"]},
+        )
+        health = client.get("/api/v1/sales/health")
+    assert response.status_code == 200
+    assert default_response.status_code == 503
+    assert health.status_code == 200
+
+
+def test_unknown_project_503(client):
+    response = client.get(
+        "/api/v1/nope/metrics",
+        headers={"Authorization": f"Bearer {API_KEY}"},
+    )
+    assert response.status_code == 503
+    assert "/admin/refresh/nope" in response.json()["detail"]
+
+
+def test_refresh_invalid_project_name(client):
+    response = client.post(
+        "/admin/refresh/bad.name",
+        headers={"Authorization": f"Bearer {ADMIN_KEY}"},
+        content=b"{}",
+    )
+    assert response.status_code == 400
+
+
+def test_lru_eviction_and_rebuild_from_snapshot(tmp_path):
+    from metricflow_server.config import settings
+    from metricflow_server.engine_manager import EngineManager
+
+    manager = EngineManager()
+    manager._sql_client = MagicMock()
+    built = []
+
+    def build(manifest_json, project):
+        built.append(project)
+        return MagicMock(name=manifest_json)
+
+    def resident():
+        return {p["name"]: p["resident"] for p in manager.projects()}
+
+    with patch.object(settings, "snapshot_dir", tmp_path), \
+            patch.object(settings, "max_loaded_engines", 1), \
+            patch.object(manager, "_build_engine", side_effect=build):
+        manager.load_manifest('{"a": 1}', "a")
+        manager.load_manifest('{"b": 1}', "b")
+        assert resident() == {"a": False, "b": True}
+
+        with manager.lease("a") as snapshot:
+            assert snapshot.engine._mock_name == '{"a": 1}'
+        assert built == ["a", "b", "a"]
+        assert resident() == {"a": True, "b": False}
+        with manager.lease("missing") as snapshot:
+            assert snapshot is None
+
+
+def test_concurrent_requests_share_one_rebuild(tmp_path):
+    import threading
+    import time
+
+    from metricflow_server.config import settings
+    from metricflow_server.engine_manager import EngineManager
+
+    manager = EngineManager()
+    manager._sql_client = MagicMock()
+    built = []
+
+    def build(manifest_json, project):
+        built.append(project)
+        time.sleep(0.05)
+        return MagicMock()
+
+    engines = []
+
+    def request():
+        with manager.lease("a") as snapshot:
+            engines.append(snapshot.engine)
+
+    with patch.object(settings, "snapshot_dir", tmp_path), \
+            patch.object(settings, "max_loaded_engines", 1), \
+            patch.object(manager, "_build_engine", side_effect=build):
+        manager.load_manifest('{"a": 1}', "a")
+        manager.load_manifest('{"b": 1}', "b")
+        threads = [threading.Thread(target=request) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    assert built == ["a", "b", "a"]
+    assert len(engines) == 8
+    assert all(e is engines[0] for e in engines)
+
+
+def test_idle_engine_evicted_without_reload(tmp_path):
+    import time
+
+    from metricflow_server.config import settings
+    from metricflow_server.engine_manager import EngineManager
+
+    manager = EngineManager()
+    manager._sql_client = MagicMock()
+    with patch.object(settings, "snapshot_dir", tmp_path), \
+            patch.object(settings, "engine_idle_seconds", 0.2), \
+            patch.object(manager, "_build_engine", side_effect=lambda *a: MagicMock()):
+        manager.load_manifest('{"a": 1}', "a")
+        with manager.lease("a") as snapshot:
+            pass
+        manager.start_idle_sweeper()
+        try:
+            deadline = time.monotonic() + 5
+            while manager.projects()[0]["resident"] and time.monotonic() < deadline:
+                time.sleep(0.05)
+        finally:
+            manager.stop_idle_sweeper()
+    assert manager.projects()[0]["resident"] is False
+    assert snapshot.released
+    assert manager.is_loaded("a")
+
+
+def test_published_engine_never_evicted_as_idle(tmp_path):
+    import pytest
+    from pydantic import ValidationError
+
+    from metricflow_server.config import Settings, settings
+    from metricflow_server.engine_manager import EngineManager
+
+    with pytest.raises(ValidationError):
+        Settings(api_key="k", admin_key="a", engine_idle_seconds=0)
+
+    manager = EngineManager()
+    manager._sql_client = MagicMock()
+    build = MagicMock(side_effect=lambda *a: MagicMock())
+    # An idle period shorter than any rebuild: every other engine is idle at publish time.
+    with patch.object(settings, "snapshot_dir", tmp_path), \
+            patch.object(settings, "engine_idle_seconds", 1e-9), \
+            patch.object(manager, "_build_engine", build):
+        manager.load_manifest('{"a": 1}', "a")
+        manager.load_manifest('{"b": 1}', "b")
+        assert [p["resident"] for p in manager.projects()] == [False, True]
+        with manager.lease("a") as snapshot:
+            assert snapshot.project == "a"
+    assert build.call_count == 3
+
+
+def test_replaced_engine_released_after_in_flight_requests_drain(tmp_path):
+    from metricflow_server.config import settings
+    from metricflow_server.engine_manager import EngineManager
+
+    manager = EngineManager()
+    manager._sql_client = MagicMock()
+    with patch.object(settings, "snapshot_dir", tmp_path), \
+            patch.object(manager, "_build_engine", side_effect=lambda *a: MagicMock()):
+        manager.load_manifest('{"v": 1}', "p")
+        with manager.lease("p") as old:
+            old.cache["metrics"] = ["cached"]
+            manager.load_manifest('{"v": 2}', "p")
+            # The in-flight request keeps its engine while the new one is served.
+            assert old.engine is not None
+            assert not old.released
+            [project] = manager.projects()
+            assert project["draining"] == [
+                {"manifest_version": old.manifest_version, "in_flight": 1}
+            ]
+            with manager.lease("p") as new:
+                assert new is not old
+                assert new.generation > old.generation
+                assert new.manifest_version != old.manifest_version
+        assert old.released
+        assert old.engine is None
+        assert old.cache == {}
+        assert manager.projects()[0]["draining"] == []
+
+
+def test_released_engine_leaves_draining_set_without_admin_read(tmp_path):
+    from metricflow_server.config import settings
+    from metricflow_server.engine_manager import EngineManager
+
+    manager = EngineManager()
+    manager._sql_client = MagicMock()
+    with patch.object(settings, "snapshot_dir", tmp_path), \
+            patch.object(manager, "_build_engine", side_effect=lambda *a: MagicMock()):
+        manager.load_manifest('{"v": 1}', "p")
+        with manager.lease("p") as old:
+            manager.load_manifest('{"v": 2}', "p")
+            assert manager._draining == {old}
+        # Nothing reads projects(); freeing the snapshot removes it on its own.
+        assert old.released
+        assert manager._draining == set()
+        # A snapshot with no in-flight requests never lingers either.
+        manager.load_manifest('{"v": 3}', "p")
+        assert manager._draining == set()
+
+
+def test_query_reports_manifest_version(client, mock_engine):
+    with _loaded(mock_engine, version="v42"):
+        response = client.post(
+            "/api/v1/query",
+            headers={"Authorization": f"Bearer {API_KEY}"},
+            json={"metrics": ["revenue"]},
+        )
+    assert response.headers["X-Manifest-Version"] == "v42"
+
+
 # ------------------------------------------------------------------
 # Admin refresh
 # ------------------------------------------------------------------
@@ -188,7 +494,7 @@ def test_query_invalid_query_exception_returns_400(client, mock_engine):
     from metricflow_semantics.errors.error_classes import CustomerFacingSemanticException
 
     mock_engine.query.side_effect = CustomerFacingSemanticException("unknown metric")
-    with patch("metricflow_server.engine_manager.engine_manager._engine", mock_engine):
+    with _loaded(mock_engine):
         response = client.post(
             "/api/v1/query",
             headers={"Authorization": f"Bearer {API_KEY}"},
@@ -201,7 +507,7 @@ def test_query_execution_exception_returns_502(client, mock_engine):
     from metricflow_semantics.errors.error_classes import ExecutionException
 
     mock_engine.query.side_effect = ExecutionException("warehouse timeout")
-    with patch("metricflow_server.engine_manager.engine_manager._engine", mock_engine):
+    with _loaded(mock_engine):
         response = client.post(
             "/api/v1/query",
             headers={"Authorization": f"Bearer {API_KEY}"},
@@ -212,7 +518,7 @@ def test_query_execution_exception_returns_502(client, mock_engine):
 
 def test_query_unexpected_error_returns_500(client, mock_engine):
     mock_engine.query.side_effect = RuntimeError("unexpected boom")
-    with patch("metricflow_server.engine_manager.engine_manager._engine", mock_engine):
+    with _loaded(mock_engine):
         response = client.post(
             "/api/v1/query",
             headers={"Authorization": f"Bearer {API_KEY}"},
@@ -221,6 +527,316 @@ def test_query_unexpected_error_returns_500(client, mock_engine):
     assert response.status_code == 500
 
 
+# ------------------------------------------------------------------
+# Canary
+# ------------------------------------------------------------------
+def _canary_manager(current, candidate):
+    from metricflow_server.engine_manager import EngineManager
+
+    manager = EngineManager()
+    manager._sql_client = MagicMock()
+    engines = iter([current, candidate])
+    build = patch.object(manager, "_build_engine", side_effect=lambda *a: next(engines))
+    return manager, build
+
+
+def test_canary_rejects_manifest_that_breaks_recent_queries(tmp_path):
+    from metricflow_server.canary import CanaryRejected
+    from metricflow_server.config import settings
+
+    current, candidate = MagicMock(), MagicMock()
+    candidate.explain.side_effect = ValueError("unknown metric")
+    manager, build = _canary_manager(current, candidate)
+    with patch.object(settings, "snapshot_dir", tmp_path), \
+            patch.object(settings, "canary_enabled", True), build:
+        assert manager.load_manifest("{}", "p") is None  # no traffic yet
+        manager.record_query("p", {"metric_names": ["revenue"]})
+        with pytest.raises(CanaryRejected) as exc_info:
+            manager.load_manifest("{}", "p")
+        with manager.lease("p") as snapshot:
+            assert snapshot.engine is current
+
+    report = exc_info.value.report
+    assert report.sampled == 1
+    assert report.candidate_failures == 1
+    assert report.regressions == [{"metric_names": ["revenue"]}]
+    assert manager.canary_report("p") is report
+
+
+def test_canary_passes_and_swaps(tmp_path):
+    from metricflow_server.config import settings
+
+    current, candidate = MagicMock(), MagicMock()
+    manager, build = _canary_manager(current, candidate)
+    with patch.object(settings, "snapshot_dir", tmp_path), \
+            patch.object(settings, "canary_enabled", True), build:
+        manager.load_manifest("{}", "p")
+        manager.record_query("p", {"metric_names": ["revenue"]})
+        manager.record_query("p", {"metric_names": ["revenue"]})
+        report = manager.load_manifest("{}", "p")
+        with manager.lease("p") as snapshot:
+            assert snapshot.engine is candidate
+    assert report.passed
+    assert report.sampled == 1
+    # One warm-up compile plus one timed compile.
+    assert candidate.explain.call_count == 2
+
+
+def test_canary_reruns_when_manifest_replaced_during_canary(tmp_path):
+    from metricflow_server import engine_manager as em
+    from metricflow_server.canary import CanaryReport
+    from metricflow_server.config import settings
+    from metricflow_server.engine_manager import EngineManager
+
+    manager = EngineManager()
+    manager._sql_client = MagicMock()
+    baselines = []
+
+    def canary(current, candidate, shapes):
+        baselines.append(current)
+        if len(baselines) == 1:
+            # A concurrent refresh lands while the first canary is running.
+            with patch.object(settings, "canary_enabled", False):
+                manager.load_manifest('{"v": 2}', "p")
+        return CanaryReport(sampled=len(shapes))
+
+    with patch.object(settings, "snapshot_dir", tmp_path), \
+            patch.object(settings, "canary_enabled", True), \
+            patch.object(manager, "_build_engine", side_effect=lambda m, p: MagicMock(name=m)), \
+            patch.object(em, "run_canary", side_effect=canary):
+        manager.load_manifest('{"v": 1}', "p")
+        manager.record_query("p", {"metric_names": ["revenue"]})
+        manager.load_manifest('{"v": 3}', "p")
+        with manager.lease("p") as snapshot:
+            assert snapshot.engine._mock_name == '{"v": 3}'
+
+    # The second run compared against the manifest that replaced the first baseline.
+    assert [e._mock_name for e in baselines] == ['{"v": 1}', '{"v": 2}']
+    assert list(tmp_path.iterdir()) == [tmp_path / "p.json"]
+
+
+def test_canary_timing_ignores_cold_candidate_cache():
+    import time
+
+    from metricflow_server.canary import run_canary
+
+    def engine_with_cache(warm):
+        """Fake engine whose first plan of a shape is slow, like a cold plan cache."""
+        seen = set(warm)
+        engine = MagicMock()
+
+        def explain(mf_request):
+            key = tuple(mf_request.metric_names)
+            if key not in seen:
+                seen.add(key)
+                time.sleep(0.06)
+
+        engine.explain.side_effect = explain
+        return engine
+
+    shapes = [{"metric_names": ["revenue"]}, {"metric_names": ["orders"]}]
+    current = engine_with_cache(warm=[("revenue",), ("orders",)])
+    candidate = engine_with_cache(warm=[])
+    report = run_canary(current, candidate, shapes)
+    assert report.passed, report.reason
+    assert report.candidate_planning_ms < 50
+
+
+def test_refresh_canary_rejected_returns_409(client):
+    from metricflow_server.canary import CanaryRejected, CanaryReport
+
+    report = CanaryReport(sampled=3, passed=False, reason="3 of 3 recent queries no longer compile")
+    with patch.object(engine_manager, "load_manifest", side_effect=CanaryRejected(report)):
+        response = client.post(
+            "/admin/refresh",
+            headers={"Authorization": f"Bearer {ADMIN_KEY}"},
+            content=b"{}",
+        )
+    assert response.status_code == 409
+    assert response.json()["detail"]["canary"]["sampled"] == 3
+
+
+# ------------------------------------------------------------------
+# Traffic capture and replay
+# ------------------------------------------------------------------
+def test_capture_writes_query_log(tmp_path, client, mock_engine):
+    import json
+
+    from metricflow_server import capture
+    from metricflow_server.config import settings
+
+    with patch.object(settings, "capture_dir", tmp_path):
+        capture.start_capture()
+        try:
+            with _loaded(mock_engine):
+                client.post(
+                    "/api/v1/query",
+                    headers={"Authorization": f"Bearer {API_KEY}"},
+                    json={"metrics": ["revenue"], "group_by": ["location__location_name"]},
+                )
+            client.post(
+                "/api/v1/query",
+                headers={"Authorization": f"Bearer {API_KEY}"},
+                json={"metrics": ["revenue"]},
+            )
+        finally:
+            capture.stop_capture()
+
+    lines = (tmp_path / "requests.jsonl").read_text().splitlines()
+    records = [json.loads(line) for line in lines]
+    assert [r["status"] for r in records] == [200, 503]
+    assert records[0]["request"] == {
+        "metrics": ["revenue"], "group_by": ["location__location_name"],
+    }
+    assert records[0]["rows"] == 2
+    assert records[1]["rows"] is None
+
+
+def test_capture_latency_includes_streaming_spilled_body(client, mock_engine):
+    import time
+
+    from metricflow_server import capture
+    from metricflow_server.api import routes
+    from metricflow_server.api.results import iter_spilled_response
+    from metricflow_server.config import settings
+
+    streamed = {}
+
+    def slow_body(*args):
+        start = time.perf_counter()
+        for chunk in iter_spilled_response(*args):
+            time.sleep(0.01)
+            yield chunk
+        streamed["ms"] = (time.perf_counter() - start) * 1000
+
+    def record_query(**kwargs):
+        # The body must have been fully streamed by the time the request is recorded.
+        assert "ms" in streamed
+        assert kwargs["latency_ms"] >= streamed["ms"]
+        recorded.append(kwargs)
+
+    recorded = []
+    with patch.object(settings, "spill_threshold_rows", 1), \
+            patch.object(routes, "iter_spilled_response", slow_body), \
+            patch.object(capture, "record_query", side_effect=record_query), \
+            _loaded(mock_engine):
+        resp = client.post(
+            "/api/v1/query",
+            headers={"Authorization": f"Bearer {API_KEY}"},
+            json={"metrics": ["revenue"], "group_by": ["location__location_name"]},
+        )
+
+    assert resp.status_code == 200
+    [record] = recorded
+    assert record["status_code"] == 200
+    assert record["rows"] == 2
+
+
+def test_replay_reports_latencies_and_errors(tmp_path):
+    import json
+
+    from metricflow_server.replay import load_records, replay
+
+    log = tmp_path / "requests.jsonl"
+    log.write_text("\n".join(
+        json.dumps({"ts": ts, "project": "default", "request": {"metrics": [m]}})
+        for ts, m in [(2.0, "b"), (1.0, "a"), (3.0, "c")]
+    ))
+    records = load_records([log])
+    assert [r["request"]["metrics"] for r in records] == [["a"], ["b"], ["c"]]
+
+    stats = replay(
+        records,
+        lambda r: 502 if r["request"]["metrics"] == ["c"] else 200,
+        speedup=0,
+        concurrency=2,
+    )
+    assert stats.total == 3
+    assert stats.errors == 1
+    assert stats.statuses == {200: 2, 502: 1}
+    assert stats.percentile(50) <= stats.percentile(99)
+    assert "errors:      1 (33.3%)" in stats.summary()
+
+
+def test_load_records_skips_malformed_lines(tmp_path, capsys):
+    import json
+
+    from metricflow_server.replay import load_records
+
+    log = tmp_path / "requests.jsonl"
+    good = json.dumps({"ts": 1.0, "request": {"metrics": ["a"]}})
+    no_ts = json.dumps({"request": {"metrics": ["b"]}})
+    # The last line was cut off mid-write.
+    log.write_text(f"{good}\n{no_ts}\n{good[:20]}")
+    records = load_records([log])
+    assert [r["request"]["metrics"] for r in records] == [["a"]]
+    err = capsys.readouterr().err
+    assert f"{log}:2" in err
+    assert f"{log}:3" in err
+
+
+def test_replay_counts_queueing_delay_in_latency():
+    import time
+
+    from metricflow_server.replay import replay
+
+    # Three requests due at once, but only one worker: the last waits ~100 ms.
+    records = [{"ts": 0.0, "request": {"metrics": ["a"]}} for _ in range(3)]
+    stats = replay(records, lambda r: time.sleep(0.05) or 200, speedup=1.0, concurrency=1)
+    assert stats.total == 3
+    assert max(stats.latencies_ms) >= 140
+    assert max(stats.lag_ms) >= 90
+
+
+def test_replay_counts_sender_exceptions_as_errors():
+    from metricflow_server.replay import CLIENT_ERROR, replay
+
+    records = [{"ts": 0.0, "request": {"metrics": ["a"]}}, {"ts": 0.0}]
+    stats = replay(records, lambda r: r["request"] and 200, speedup=0, concurrency=2)
+    assert stats.total == 2
+    assert stats.statuses == {200: 1, CLIENT_ERROR: 1}
+    assert "client_error=1" in stats.summary()
+
+
+# ------------------------------------------------------------------
+# Startup
+# ------------------------------------------------------------------
+def test_init_adapter_fast_path_skips_dbt_debug(tmp_path):
+    from metricflow_server.config import settings
+    from metricflow_server.engine_manager import EngineManager
+
+    manager = EngineManager()
+    with patch.object(settings, "validate_connection", "off"), \
+            patch.object(manager, "_register_adapter") as register, \
+            patch.object(manager, "_register_adapter_via_debug") as via_debug, \
+            patch("dbt_metricflow.cli.dbt_connectors.adapter_backed_client.AdapterBackedSqlClient"):
+        manager.init_adapter(tmp_path)
+    register.assert_called_once()
+    via_debug.assert_not_called()
+    assert "adapter" in manager.startup_timings
+    assert manager.connection_status == "skipped"
+
+
+def test_validate_connection_failure_recorded():
+    from metricflow_server.engine_manager import EngineManager
+
+    manager = EngineManager()
+    manager._adapter = MagicMock()
+    manager._adapter.debug_query.side_effect = RuntimeError("refused")
+    with pytest.raises(RuntimeError):
+        manager.validate_connection()
+    assert manager.connection_status == "failed: refused"
+
+
+def test_startup_report(client):
+    response = client.get(
+        "/admin/startup",
+        headers={"Authorization": f"Bearer {ADMIN_KEY}"},
+    )
+    assert response.status_code == 200
+    assert "profiles" in response.json()["phases_ms"]
+
+
 # ------------------------------------------------------------------
 # serialize_cell
 # ------------------------------------------------------------------